@@ -1,5 +1,6 @@
 from __future__ import annotations
 import argparse, glob
+from concurrent.futures import ThreadPoolExecutor
 from core.transport import SocketTransport, USBTMCTransport, LoggingTransport
 from core.plan_runner import run_plan, Context
 from drivers.siglent.spd3303xe import SPD3303XE
@@ -30,10 +31,19 @@ def _usbtmc_idn(dev: str) -> str | None:
         return None
 
 
-def _usb_autodetect():
+def _probe_usbtmc(devices: list[str]) -> dict[str, str | None]:
+    """Query *IDN? on every device concurrently; scan time is the slowest probe, not the sum."""
+    if not devices:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(8, len(devices))) as pool:
+        return dict(zip(devices, pool.map(_usbtmc_idn, devices)))
+
+
+def _usb_autodetect(idns: dict[str, str | None] | None = None):
+    if idns is None:
+        idns = _probe_usbtmc(sorted(glob.glob("/dev/usbtmc*")))
     mapping = {}
-    for dev in sorted(glob.glob("/dev/usbtmc*")):
-        idn = _usbtmc_idn(dev)
+    for dev, idn in idns.items():
         if not idn:
             continue
         if "SPD3303X" in idn and "spd" not in mapping:
@@ -75,11 +85,11 @@ def main():
         if not devices:
             print("No /dev/usbtmc* devices found.")
             return
+        idns = _probe_usbtmc(devices)
         print("Detected USBTMC devices and IDNs:")
         for dev in devices:
-            idn = _usbtmc_idn(dev) or "(no response)"
-            print(f"  {dev}: {idn}")
-        autod = _usb_autodetect()
+            print(f"  {dev}: {idns[dev] or '(no response)'}")
+        autod = _usb_autodetect(idns)
         if autod:
             print("\nSuggested role mapping:")
             for role in ("spd", "sdm", "scope"):
@@ -91,7 +101,7 @@ def main():
         addr = int(args.addr, 0)
         try:
             # Reuse the same debug log file if provided
-            log_fp = open(args.debug_log, "a") if getattr(args, "debug_log", None) else None
+            log_fp = open(args.debug_log, "ab", buffering=1 << 16) if getattr(args, "debug_log", None) else None
             ens = ENS210Serial(args.ens210, addr=addr, log_file=log_fp)
         except Exception as e:
             raise SystemExit(f"Failed to open ENS210 serial dongle at {args.ens210}: {e}")
@@ -121,8 +131,8 @@ def main():
         if not args.ens_only and (not spd_arg or not sdm_arg):
             raise SystemExit("Missing SPD/SDM targets. Provide --spd and --sdm, or use --ens-only.")
 
-        # Open debug log once if requested
-        log_fp = open(args.debug_log, "a") if args.debug_log else None
+        # Open debug log once if requested; records are buffered and flushed by run_plan
+        log_fp = open(args.debug_log, "ab", buffering=1 << 16) if args.debug_log else None
 
         def open_target(arg):
             if isinstance(arg, str) and arg.startswith("/dev/usbtmc"):
@@ -139,7 +149,11 @@ def main():
         ens = ENS210Serial(args.ens210, log_file=log_fp) if args.ens210 else None
 
         ctx = Context(psu=spd, dmm=sdm, scope=scope, ens210=ens)
-        run_plan(args.plan, ctx, args.out)
+        try:
+            run_plan(args.plan, ctx, args.out)
+        finally:
+            if log_fp:
+                log_fp.close()
 
 
 if __name__ == "__main__":
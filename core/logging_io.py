@@ -1,33 +1,241 @@
 from __future__ import annotations
-import io, json, base64
-from typing import Optional
+import io, json, base64, zlib
+from array import array
+from typing import Iterable, Optional, Sequence
 
-def write_parquet(rows: list[dict], out_path: str) -> None:
+_NAN = float("nan")
+
+try:
+    import orjson
+
+    def encode_log_record(rec: dict) -> bytes:
+        """Serialize one NDJSON log record, newline included."""
+        return orjson.dumps(rec, option=orjson.OPT_APPEND_NEWLINE)
+
+    def dumps_bytes(obj) -> bytes:
+        """Serialize one JSON value to bytes, no newline."""
+        return orjson.dumps(obj)
+except ImportError:  # stdlib fallback; orjson is an optional speedup
+    def encode_log_record(rec: dict) -> bytes:
+        """Serialize one NDJSON log record, newline included."""
+        return (json.dumps(rec, separators=(",", ":")) + "\n").encode()
+
+    def dumps_bytes(obj) -> bytes:
+        """Serialize one JSON value to bytes, no newline."""
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def binary_log_file(log_file):
+    """Return a binary writer for a debug-log handle.
+
+    Log records are written as bytes. A text-mode file from ``open()`` is
+    unwrapped to its underlying binary buffer; a text stream without one
+    (e.g. ``io.StringIO``) is rejected instead of silently losing records.
+    """
+    if log_file is None or not isinstance(log_file, io.TextIOBase):
+        return log_file
+    raw = getattr(log_file, "buffer", None)
+    if raw is None:
+        raise TypeError("log_file must be a binary stream, e.g. open(path, 'ab')")
+    # Anything the caller already wrote as text goes out ahead of our records
+    log_file.flush()
+    return raw
+
+
+class ColumnBuffer:
+    """Struct-of-arrays sample buffer for Parquet output.
+
+    Each column is a typed ``array.array``: doubles for numeric columns (NaN
+    marks a missing value) and signed bytes for boolean columns (-1 marks a
+    missing value). Rows are appended positionally in ``columns`` order.
+    """
+
+    def __init__(self, columns: Sequence[str], bool_columns: Iterable[str] = ()):
+        self.columns = tuple(columns)
+        bools = set(bool_columns)
+        self._bufs = [array("b") if c in bools else array("d") for c in self.columns]
+        # Per-column type dispatch is resolved once here, not per cell in append()
+        self._dputs = [(i, b.append) for i, b in enumerate(self._bufs) if b.typecode == "d"]
+        self._bputs = [(i, b.append) for i, b in enumerate(self._bufs) if b.typecode == "b"]
+
+    def __len__(self) -> int:
+        return len(self._bufs[0]) if self._bufs else 0
+
+    def append(self, row: Sequence) -> None:
+        for i, put in self._dputs:
+            v = row[i]
+            put(_NAN if v is None else float(v))
+        for i, put in self._bputs:
+            v = row[i]
+            put(-1 if v is None else (1 if v else 0))
+
+    def clear(self) -> None:
+        for buf in self._bufs:
+            del buf[:]
+
+    def schema(self):
+        import pyarrow as pa
+        return pa.schema([(c, pa.float64() if b.typecode == "d" else pa.bool_()) for c, b in zip(self.columns, self._bufs)])
+
+    def to_record_batch(self):
+        """Build a RecordBatch over the buffered columns.
+
+        Double columns wrap the array memory without copying, so the batch
+        must be released before the buffer is cleared or appended to.
+        """
+        import pyarrow as pa, pyarrow.compute as pc
+        n = len(self)
+        arrays = []
+        for buf in self._bufs:
+            if buf.typecode == "d":
+                data = pa.py_buffer(buf)
+                arr = pa.Array.from_buffers(pa.float64(), n, [None, data])
+                nan = pc.is_nan(arr)
+                if pc.any(nan).as_py():
+                    # The NaN sentinel becomes null: validity is the inverted NaN mask
+                    arr = pa.Array.from_buffers(pa.float64(), n, [pc.invert(nan).buffers()[1], data])
+            else:
+                # -1/0/1 codes -> bit-packed values plus a validity bitmap, all in C
+                codes = pa.Array.from_buffers(pa.int8(), n, [None, pa.py_buffer(buf)])
+                valid = pc.greater_equal(codes, 0)
+                values = pc.greater(codes, 0).buffers()[1]
+                arr = pa.Array.from_buffers(pa.bool_(), n, [None if pc.all(valid).as_py() else valid.buffers()[1], values])
+            arrays.append(arr)
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema())
+
+
+def _parquet_options(compression, compression_level, use_dictionary, write_statistics, data_page_size) -> dict:
+    # Unset level: ZSTD 3 for zstd, codec default otherwise (snappy/none take no level)
+    if compression_level is None and compression.lower() == "zstd":
+        compression_level = 3
+    return {
+        "compression": compression,
+        "compression_level": compression_level,
+        "use_dictionary": list(use_dictionary) if isinstance(use_dictionary, tuple) else use_dictionary,
+        "write_statistics": write_statistics,
+        "data_page_size": data_page_size,
+    }
+
+
+def write_parquet(
+    buf: ColumnBuffer,
+    out_path: str,
+    *,
+    compression: str = "zstd",
+    compression_level: Optional[int] = None,
+    use_dictionary=("v_set", "i_set"),
+    write_statistics=True,
+    data_page_size: int = 1 << 20,
+    row_group_size: int = 500_000,
+) -> None:
+    """Write buffered samples to Parquet.
+
+    Defaults favour small files: ZSTD level 3, large row groups and dictionary
+    encoding only for the setpoint columns, which repeat for a whole step.
+    When ingestion latency matters more than disk space, pass
+    ``compression="none", use_dictionary=False, write_statistics=False``.
+    """
     import pyarrow as pa, pyarrow.parquet as pq
-    if not rows:
-        pq.write_table(pa.table({}), out_path); return
-    cols = sorted({k for r in rows for k in r.keys()})
-    arrays = {c: [r.get(c, None) for r in rows] for c in cols}
-    table = pa.table(arrays)
-    pq.write_table(table, out_path, compression="zstd")
+    table = pa.Table.from_batches([buf.to_record_batch()])
+    pq.write_table(
+        table, out_path,
+        row_group_size=row_group_size,
+        **_parquet_options(compression, compression_level, use_dictionary, write_statistics, data_page_size),
+    )
+
+
+class ParquetStream:
+    """Incremental Parquet writer with bounded memory.
+
+    Rows accumulate in a ColumnBuffer and are written out as one row group
+    every ``batch_rows`` rows, so long runs never hold more than one batch in
+    RAM. Write options match ``write_parquet``. Call ``close()`` to flush the
+    final batch and write the file footer.
+    """
+
+    def __init__(
+        self,
+        out_path: str,
+        columns: Sequence[str],
+        bool_columns: Iterable[str] = (),
+        *,
+        batch_rows: int = 65536,
+        compression: str = "zstd",
+        compression_level: Optional[int] = None,
+        use_dictionary=("v_set", "i_set"),
+        write_statistics=True,
+        data_page_size: int = 1 << 20,
+    ):
+        import pyarrow.parquet as pq
+        self.batch_rows = batch_rows
+        self._buf = ColumnBuffer(columns, bool_columns)
+        self._writer = pq.ParquetWriter(
+            out_path, self._buf.schema(),
+            **_parquet_options(compression, compression_level, use_dictionary, write_statistics, data_page_size),
+        )
+
+    def append(self, row: Sequence) -> None:
+        self._buf.append(row)
+        if len(self._buf) >= self.batch_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        if len(self._buf):
+            self._writer.write_batch(self._buf.to_record_batch())
+            self._buf.clear()
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            self._writer.close()
+
+
+def _span(vals: list[float]) -> tuple[float, float]:
+    lo, hi = min(vals), max(vals)
+    if hi == lo:
+        lo, hi = lo - 0.5, hi + 0.5
+    return lo, hi
 
 
 def save_svg_with_embedded_data(xs: list[float], ys: list[float], out_svg: str, title: str = "Waveform", extra_meta: Optional[dict] = None) -> dict:
-    import matplotlib; matplotlib.use("Agg")
-    import matplotlib.pyplot as plt
-    fig = plt.figure(figsize=(8,3), dpi=120)
-    ax = fig.add_subplot(111)
-    ax.plot(xs, ys)
-    ax.set_title(title); ax.set_xlabel("Time (s)"); ax.set_ylabel("Voltage (V)")
-    fig.tight_layout()
-    buf = io.StringIO(); fig.savefig(buf, format="svg"); plt.close(fig)
-    svg_text = buf.getvalue()
-    payload = {"format":"sigbench/waveform","version":1,"x":xs,"y":ys,"meta":extra_meta or {}}
-    b64 = base64.b64encode(json.dumps(payload, separators=(",",":")).encode()).decode()
-    if "<metadata>" in svg_text:
-        svg_text = svg_text.replace("<metadata>", f"<metadata><sigbench>{b64}</sigbench>", 1)
+    """Write a line plot of ``ys`` against ``xs`` as SVG with the raw data embedded.
+
+    The SVG is emitted directly (a single polyline path) rather than rendered
+    through Matplotlib. The raw samples are stored as zlib-compressed,
+    base64-encoded JSON in ``<metadata><sigbench encoding="zlib">``; see
+    ``tools/extract_from_svg.py``.
+    """
+    from xml.sax.saxutils import escape
+    w, h = 960, 360
+    left, right, top, bottom = 80, 20, 36, 50
+    pw, ph = w - left - right, h - top - bottom
+    path = ""
+    if xs and ys:
+        xmin, xmax = _span(xs); ymin, ymax = _span(ys)
+        sx, sy = pw / (xmax - xmin), ph / (ymax - ymin)
+        # Subsequent coordinate pairs after M are implicit line-tos
+        path = "M" + " ".join(f"{left + (x - xmin) * sx:.2f},{top + ph - (y - ymin) * sy:.2f}" for x, y in zip(xs, ys))
     else:
-        insert_at = svg_text.find(">")+1
-        svg_text = svg_text[:insert_at] + f"<metadata><sigbench>{b64}</sigbench></metadata>" + svg_text[insert_at:]
-    open(out_svg, "w", encoding="utf-8").write(svg_text)
+        xmin = xmax = ymin = ymax = 0.0
+    payload = {"format":"sigbench/waveform","version":1,"x":xs,"y":ys,"meta":extra_meta or {}}
+    b64 = base64.b64encode(zlib.compress(json.dumps(payload, separators=(",",":")).encode(), 6)).decode()
+    svg_text = "\n".join([
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{w}" height="{h}" viewBox="0 0 {w} {h}" font-family="sans-serif" font-size="12">',
+        f'<metadata><sigbench encoding="zlib">{b64}</sigbench></metadata>',
+        f'<rect width="{w}" height="{h}" fill="white"/>',
+        f'<rect x="{left}" y="{top}" width="{pw}" height="{ph}" fill="none" stroke="black"/>',
+        f'<path d="{path}" fill="none" stroke="#1f77b4" stroke-width="1.5"/>',
+        f'<text x="{left + pw / 2}" y="{top - 12}" text-anchor="middle" font-size="14">{escape(title)}</text>',
+        f'<text x="{left}" y="{top + ph + 18}" text-anchor="start">{xmin:.6g}</text>',
+        f'<text x="{left + pw}" y="{top + ph + 18}" text-anchor="end">{xmax:.6g}</text>',
+        f'<text x="{left + pw / 2}" y="{h - 10}" text-anchor="middle">Time (s)</text>',
+        f'<text x="{left - 6}" y="{top + ph}" text-anchor="end">{ymin:.6g}</text>',
+        f'<text x="{left - 6}" y="{top + 10}" text-anchor="end">{ymax:.6g}</text>',
+        f'<text x="16" y="{top + ph / 2}" text-anchor="middle" transform="rotate(-90 16 {top + ph / 2})">Voltage (V)</text>',
+        "</svg>",
+        "",
+    ])
+    with open(out_svg, "w", encoding="utf-8") as f:
+        f.write(svg_text)
     return {"points": len(xs), "file": out_svg}
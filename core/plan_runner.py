@@ -1,9 +1,20 @@
 from __future__ import annotations
-import time, csv, yaml, statistics
-from collections import deque
+import functools, os, time, yaml, statistics
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import Any, Optional
-from .logging_io import write_parquet, save_svg_with_embedded_data
+from .logging_io import ParquetStream, save_svg_with_embedded_data
+
+# Output columns, in CSV/Parquet order; rows are built positionally to match
+COLUMNS = ("t_s","v_set","i_set","v_meas","i_meas","scope_vpp","scope_vrms","temp_c","humidity_pct","ens_ok")
+
+# libyaml-backed loader when PyYAML was built with it
+_PlanLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# CSV output is flushed every this many rows (and at status prints / exit)
+_CSV_FLUSH_ROWS = 256
+
 
 @dataclass
 class Context:
@@ -13,9 +24,97 @@ class Context:
     ens210: Optional[Any] = None
 
 
-def run_plan(plan_path: str, ctx: Context, out_path: str):
+class _SampleWindow:
+    """Time-bounded window of (t, value) samples kept in a fixed-size ring.
+
+    Samples more than ``span_s`` older than the newest are dropped on append.
+    Capacity is sized from the sample rate up front, so appends never
+    allocate; if the ring does fill, the oldest sample is overwritten.
+    """
+
+    def __init__(self, span_s: float, capacity: int):
+        self.span_s = span_s
+        self._cap = max(int(capacity), 2)
+        self._t = array("d", bytes(8 * self._cap))
+        self._v = array("d", bytes(8 * self._cap))
+        self._head = 0  # ring index of the oldest sample
+        self._n = 0
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, i: int) -> tuple[float, float]:
+        if i < 0:
+            i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError(i)
+        j = (self._head + i) % self._cap
+        return self._t[j], self._v[j]
+
+    def append(self, t: float, v: float) -> None:
+        cap = self._cap
+        if self._n == cap:
+            self._head = (self._head + 1) % cap
+            self._n -= 1
+        j = (self._head + self._n) % cap
+        self._t[j] = t
+        self._v[j] = v
+        self._n += 1
+        while self._n and (t - self._t[self._head]) > self.span_s:
+            self._head = (self._head + 1) % cap
+            self._n -= 1
+
+    def clear(self) -> None:
+        self._head = self._n = 0
+
+
+@functools.lru_cache(maxsize=16)
+def _load_plan(plan_path: str, mtime_ns: int):
+    # Keyed on mtime so an edited plan is re-read; callers must not mutate the result
     with open(plan_path, "r") as f:
-        plan = yaml.safe_load(f)
+        return yaml.load(f, Loader=_PlanLoader)
+
+
+def _negdv_triggered(window, require_s: float, threshold_v: float) -> bool:
+    """True once the window spans ``require_s`` and voltage fell by ``threshold_v``."""
+    if len(window) < 2:
+        return False
+    t_first, v_first = window[0]
+    t_last, v_last = window[-1]
+    return (t_last - t_first) >= require_s and (v_last - v_first) <= threshold_v
+
+
+def _slope_per_min(window, min_span_s: float) -> Optional[float]:
+    """Change per minute between the oldest and newest sample, or None if the window is too short."""
+    if len(window) < 2:
+        return None
+    t_first, x_first = window[0]
+    t_last, x_last = window[-1]
+    duration = t_last - t_first
+    if duration < min_span_s:
+        return None
+    return (x_last - x_first) / max(duration, 1e-9) * 60.0
+
+
+def _csv_line(values) -> str:
+    # Every column is a number, bool or None, so no csv quoting is needed
+    return ",".join("" if v is None else str(v) for v in values) + "\r\n"
+
+
+def _flush_logs(ctx: Context) -> None:
+    # Only LoggingTransport-wrapped instruments have anything to flush
+    for dev in (ctx.psu, ctx.dmm, ctx.scope):
+        flush = getattr(getattr(dev, "t", None), "flush", None)
+        if flush is not None:
+            flush()
+    # The ENS210 talks serial directly and may buffer its own log records
+    flush = getattr(ctx.ens210, "flush", None)
+    if flush is not None:
+        flush()
+
+
+def run_plan(plan_path: str, ctx: Context, out_path: str):
+    plan = _load_plan(plan_path, os.stat(plan_path).st_mtime_ns)
 
     steps = plan.get("steps", [])
     sample = float(plan.get("sample_rate_hz", 1.0))
@@ -28,43 +127,54 @@ def run_plan(plan_path: str, ctx: Context, out_path: str):
     _vmin = safety.get("vmin_abort", None)
     vmin_abort = float(_vmin) if _vmin is not None else None
     max_hours = float(safety.get("max_hours", 12.0))
+    max_seconds = max_hours * 3600
     # Optional temp safety using ENS210 if available
     _maxt = safety.get("maxtemp_c", None)
     maxtemp_c = float(_maxt) if _maxt is not None else None
     _maxdtemp = safety.get("max_dtemp_c_per_min", None)
     max_dtemp_c_per_min = float(_maxdtemp) if _maxdtemp is not None else None
     temp_window_s = float(safety.get("temp_window_s", 60.0))
+    # dT/dt is only trusted once the window covers a meaningful span
+    temp_min_span_s = max(10.0, 0.25 * temp_window_s)
     negdv = safety.get("negdv", {"enabled": False})
     negdv_enabled = bool(negdv.get("enabled", False))
     negdv_window_s = float(negdv.get("window_s", 60.0))
     negdv_threshold_v = float(negdv.get("threshold_v", -0.06))
     negdv_require_s = float(negdv.get("require_s", 120.0))
 
-    t0 = time.time()
+    # Control flow runs on the monotonic clock so wall-clock jumps cannot
+    # stretch holds or skew t_s.
+    t0 = time.monotonic()
     plan_start = t0
-    window = deque()
-    temp_window = deque()
-
-    def negdv_ok() -> bool:
-        if not negdv_enabled or len(window) < 2:
-            return False
-        t_first, v_first = window[0]
-        t_last, v_last = window[-1]
-        duration = t_last - t_first
-        dv = v_last - v_first
-        return duration >= negdv_require_s and dv <= negdv_threshold_v
+    period = 1.0 / max(sample, 1e-9)
+    # Ring capacity covers a full window at the plan's sample rate, with slack
+    window = _SampleWindow(negdv_window_s, negdv_window_s * sample + 16)
+    temp_window = _SampleWindow(temp_window_s, temp_window_s * sample + 16)
 
     use_parquet = out_path.lower().endswith((".parquet", ".pq"))
     if use_parquet:
-        rows: list[dict] = []
+        # Stream row groups to disk so memory stays bounded on long runs
+        rows = ParquetStream(
+            out_path,
+            COLUMNS,
+            bool_columns=["ens_ok"],
+        )
     else:
-        fcsv = open(out_path, "w", newline="")
-        writer = csv.writer(fcsv)
-        writer.writerow(["t_s","v_set","i_set","v_meas","i_meas","scope_vpp","scope_vrms","temp_c","humidity_pct","ens_ok"])
-        try:
+        fcsv = open(out_path, "w", newline="", buffering=1 << 20)
+        fcsv.write(_csv_line(COLUMNS))
+        fcsv.flush()
+    rows_since_flush = 0
+
+    def emit(row: tuple) -> None:
+        nonlocal rows_since_flush
+        if use_parquet:
+            rows.append(row)
+            return
+        fcsv.write(_csv_line(row))
+        rows_since_flush += 1
+        if rows_since_flush >= _CSV_FLUSH_ROWS:
             fcsv.flush()
-        except Exception:
-            pass
+            rows_since_flush = 0
 
     def safe_read_ens():
         if not ctx.ens210:
@@ -75,157 +185,166 @@ def run_plan(plan_path: str, ctx: Context, out_path: str):
             return {"temp_c": None, "temp_k": None, "rh_pct": None, "ok": False}
 
     last_status = 0.0
-    for idx, step in enumerate(steps):
-        psu_cfg = step.get("psu", {})
-        dmm_cfg = step.get("dmm", {})
-        scope_cfg = step.get("scope")
-        hold = float(step.get("hold_s", hold_default))
-
-        ch = psu_cfg.get("ch", "CH1")
-        if ctx.psu:
-            if "current" in psu_cfg:
-                ctx.psu.set_current(ch, float(psu_cfg["current"]))
-            if "voltage" in psu_cfg:
-                ctx.psu.set_voltage(ch, float(psu_cfg["voltage"]))
-            if psu_cfg.get("on", True):
-                ctx.psu.output_on(ch)
-            else:
-                ctx.psu.output_off(ch)
-
-        func = dmm_cfg.get("function", "VOLT:DC")
-        rng = dmm_cfg.get("range", None)
-        if ctx.dmm:
-            ctx.dmm.set_function(func, rng)
-
-        if scope_cfg and ctx.scope:
-            chs = scope_cfg.get("channel", "C1")
-            probe = scope_cfg.get("probe")
-            scale = scope_cfg.get("scale")
-            tdiv = scope_cfg.get("tdiv", 0.001)
-            trig_level = scope_cfg.get("trig_level", 0.02)
-            trig_slope = scope_cfg.get("trig_slope", "POS")
-            points = scope_cfg.get("points")
-            # Keep the scope running; we'll arm a single capture just-in-time
-            ctx.scope.set_channel(chs, on=True, scale=scale, probe=probe)
-            ctx.scope.set_timebase(tdiv, points=points)
-            ctx.scope.set_trigger_edge(chs, trig_level, trig_slope)
-
-        t_end = time.time() + hold
-        last_scope = (None, None)
-        if not step.get("accumulate_window", False):
-            window.clear()
-
-        while time.time() < t_end:
-            if (time.time() - plan_start) > max_hours * 3600:
-                print("max_hours reached; aborting")
-                return
-            vmeas = ctx.dmm.read() if ctx.dmm else None
-            imeas = ctx.psu.measure_current(ch) if ctx.psu else None
-            if vmeas is not None and vmeas > vmax:
-                print("vmax exceeded; turning off and aborting")
-                if ctx.psu:
-                    ctx.psu.output_off(ch)
-                return
-            if (vmin_abort is not None) and (vmeas is not None) and idx == 1 and vmeas < vmin_abort and psu_cfg.get("on", True):
-                print(f"vmin_abort triggered (v={vmeas} < {vmin_abort}); turning off and aborting")
-                if ctx.psu:
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sigbench-read") if (ctx.dmm and ctx.psu) else None
+    # Abort paths return from inside the loop; always finalize the output file
+    try:
+        for idx, step in enumerate(steps):
+            psu_cfg = step.get("psu", {})
+            dmm_cfg = step.get("dmm", {})
+            scope_cfg = step.get("scope")
+            hold = float(step.get("hold_s", hold_default))
+
+            ch = psu_cfg.get("ch", "CH1")
+            if ctx.psu:
+                if "current" in psu_cfg or "voltage" in psu_cfg:
+                    ctx.psu.set_levels(
+                        ch,
+                        voltage_v=float(psu_cfg["voltage"]) if "voltage" in psu_cfg else None,
+                        current_a=float(psu_cfg["current"]) if "current" in psu_cfg else None,
+                    )
+                if psu_cfg.get("on", True):
+                    ctx.psu.output_on(ch)
+                else:
                     ctx.psu.output_off(ch)
-                return
-
-            if scope_cfg and ctx.scope and last_scope == (None, None):
-                delay = float(scope_cfg.get("delay_s", 0.0))
-                if (t_end - time.time()) <= (hold - delay):
-                    # Use built-in measurements only to avoid large waveform transfers
-                    vpp = ctx.scope.measure_vpp(scope_cfg.get("channel", "C1"))
-                    vrms = ctx.scope.measure_vrms(scope_cfg.get("channel", "C1"))
-                    last_scope = (vpp, vrms)
-                    try:
-                        ctx.scope.run()
-                    except Exception:
-                        pass
-
-            now = time.time()
-            if vmeas is not None:
-                window.append((now, vmeas))
-                while window and (now - window[0][0]) > negdv_window_s:
-                    window.popleft()
-            # Temperature safety checks if ENS210 present
-            ens = safe_read_ens()
-            if ens and ens.get("temp_c") is not None:
-                temp_c_val = float(ens.get("temp_c"))
-                temp_window.append((now, temp_c_val))
-                while temp_window and (now - temp_window[0][0]) > temp_window_s:
-                    temp_window.popleft()
-                if (maxtemp_c is not None) and temp_c_val > maxtemp_c:
-                    print(f"maxtemp_c exceeded (t={temp_c_val:.2f}C > {maxtemp_c}C); turning off and aborting")
+
+            func = dmm_cfg.get("function", "VOLT:DC")
+            rng = dmm_cfg.get("range", None)
+            if ctx.dmm:
+                ctx.dmm.set_function(func, rng)
+
+            if scope_cfg and ctx.scope:
+                chs = scope_cfg.get("channel", "C1")
+                probe = scope_cfg.get("probe")
+                scale = scope_cfg.get("scale")
+                tdiv = scope_cfg.get("tdiv", 0.001)
+                trig_level = scope_cfg.get("trig_level", 0.02)
+                trig_slope = scope_cfg.get("trig_slope", "POS")
+                points = scope_cfg.get("points")
+                # Keep the scope running; we'll arm a single capture just-in-time
+                ctx.scope.set_channel(chs, on=True, scale=scale, probe=probe)
+                ctx.scope.set_timebase(tdiv, points=points)
+                ctx.scope.set_trigger_edge(chs, trig_level, trig_slope)
+
+            # Step config is fixed for the whole hold; resolve it once
+            v_set_cfg = psu_cfg.get("voltage")
+            i_set_cfg = psu_cfg.get("current")
+            check_vmin = (vmin_abort is not None) and idx == 1 and psu_cfg.get("on", True)
+            terminate_on_negdv = negdv_enabled and step.get("terminate_on_negdv", False)
+            if scope_cfg:
+                scope_ch = scope_cfg.get("channel", "C1")
+                scope_delay = float(scope_cfg.get("delay_s", 0.0))
+
+            next_deadline = time.monotonic()
+            t_end = next_deadline + hold
+            last_scope = (None, None)
+            if not step.get("accumulate_window", False):
+                window.clear()
+
+            # One clock read per sample drives the hold, max_hours, scope delay and t_s
+            while (now := time.monotonic()) < t_end:
+                if (now - plan_start) > max_seconds:
+                    print("max_hours reached; aborting")
+                    return
+                if pool is not None:
+                    # DMM and PSU are separate instruments: overlap the two round-trips
+                    fut_v = pool.submit(ctx.dmm.read)
+                    imeas = ctx.psu.measure_current(ch)
+                    vmeas = fut_v.result()
+                else:
+                    vmeas = ctx.dmm.read() if ctx.dmm else None
+                    imeas = ctx.psu.measure_current(ch) if ctx.psu else None
+                if vmeas is not None and vmeas > vmax:
+                    print("vmax exceeded; turning off and aborting")
                     if ctx.psu:
                         ctx.psu.output_off(ch)
                     return
-                if (max_dtemp_c_per_min is not None) and len(temp_window) >= 2:
-                    t_first, temp_first = temp_window[0]
-                    duration = now - t_first
-                    if duration >= max(10.0, 0.25 * temp_window_s):
-                        slope_per_min = (temp_c_val - temp_first) / max(duration, 1e-9) * 60.0
-                        if slope_per_min > max_dtemp_c_per_min:
+                if check_vmin and (vmeas is not None) and vmeas < vmin_abort:
+                    print(f"vmin_abort triggered (v={vmeas} < {vmin_abort}); turning off and aborting")
+                    if ctx.psu:
+                        ctx.psu.output_off(ch)
+                    return
+
+                if scope_cfg and ctx.scope and last_scope == (None, None):
+                    if (t_end - now) <= (hold - scope_delay):
+                        # Use built-in measurements only to avoid large waveform transfers
+                        vpp = ctx.scope.measure_vpp(scope_ch)
+                        vrms = ctx.scope.measure_vrms(scope_ch)
+                        last_scope = (vpp, vrms)
+                        try:
+                            ctx.scope.run()
+                        except Exception:
+                            pass
+
+                if vmeas is not None:
+                    window.append(now, vmeas)
+                # One ENS210 transaction per sample, shared by the safety checks and the record
+                ens = safe_read_ens()
+                if ens:
+                    temp_c, rh_pct, ens_ok = ens.get("temp_c"), ens.get("rh_pct"), ens.get("ok")
+                else:
+                    temp_c = rh_pct = ens_ok = None
+                if temp_c is not None:
+                    temp_c_val = float(temp_c)
+                    temp_window.append(now, temp_c_val)
+                    if (maxtemp_c is not None) and temp_c_val > maxtemp_c:
+                        print(f"maxtemp_c exceeded (t={temp_c_val:.2f}C > {maxtemp_c}C); turning off and aborting")
+                        if ctx.psu:
+                            ctx.psu.output_off(ch)
+                        return
+                    if max_dtemp_c_per_min is not None:
+                        slope_per_min = _slope_per_min(temp_window, temp_min_span_s)
+                        if slope_per_min is not None and slope_per_min > max_dtemp_c_per_min:
                             print(f"max_dtemp_c_per_min exceeded (dT/dt={slope_per_min:.2f}C/min > {max_dtemp_c_per_min}C/min); turning off and aborting")
                             if ctx.psu:
                                 ctx.psu.output_off(ch)
                             return
-            if step.get("terminate_on_negdv", False) and negdv_ok():
-                if ctx.psu:
-                    ctx.psu.output_off(ch)
-                ens = safe_read_ens()
-                rec = {
-                    "t_s": now - t0,
-                    "v_set": psu_cfg.get("voltage"),
-                    "i_set": psu_cfg.get("current"),
-                    "v_meas": vmeas,
-                    "i_meas": imeas,
-                    "scope_vpp": last_scope[0],
-                    "scope_vrms": last_scope[1],
-                    "temp_c": (ens or {}).get("temp_c"),
-                    "humidity_pct": (ens or {}).get("rh_pct"),
-                    "ens_ok": (ens or {}).get("ok"),
-                }
-                if use_parquet:
-                    rows.append(rec)
+                # Positional in COLUMNS order
+                row = (
+                    now - t0,
+                    v_set_cfg,
+                    i_set_cfg,
+                    vmeas,
+                    imeas,
+                    last_scope[0],
+                    last_scope[1],
+                    temp_c,
+                    rh_pct,
+                    ens_ok,
+                )
+                if terminate_on_negdv and _negdv_triggered(window, negdv_require_s, negdv_threshold_v):
+                    if ctx.psu:
+                        ctx.psu.output_off(ch)
+                    emit(row)
+                    return
+
+                emit(row)
+                # Periodic status to stdout
+                if status_every_s > 0:
+                    if (now - last_status) >= status_every_s:
+                        print(f"t={now - t0:6.1f}s step={idx} vset={v_set_cfg} v={vmeas} i={imeas} temp={temp_c}")
+                        last_status = now
+                        if not use_parquet:
+                            fcsv.flush()
+                            rows_since_flush = 0
+                        _flush_logs(ctx)
+                # Pace against absolute deadlines so loop work does not accumulate drift
+                next_deadline += period
+                mono = time.monotonic()
+                wait_s = next_deadline - mono
+                if wait_s > 0:
+                    time.sleep(wait_s)
                 else:
-                    writer.writerow(list(rec.values()))
-                    try:
-                        fcsv.flush()
-                    except Exception:
-                        pass
-                return
-
-            ens = safe_read_ens()
-            rec = {
-                "t_s": now - t0,
-                "v_set": psu_cfg.get("voltage"),
-                "i_set": psu_cfg.get("current"),
-                "v_meas": vmeas,
-                "i_meas": imeas,
-                "scope_vpp": last_scope[0],
-                "scope_vrms": last_scope[1],
-                "temp_c": (ens or {}).get("temp_c"),
-                "humidity_pct": (ens or {}).get("rh_pct"),
-                "ens_ok": (ens or {}).get("ok"),
-            }
+                    # Running behind: resync instead of bursting to catch up
+                    next_deadline = mono
+
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True)
+        # Close the data file first: a Parquet footer must not depend on log flushing
+        try:
             if use_parquet:
-                rows.append(rec)
+                rows.close()
             else:
-                writer.writerow(list(rec.values()))
-                try:
-                    fcsv.flush()
-                except Exception:
-                    pass
-            # Periodic status to stdout
-            if status_every_s > 0:
-                if (now - last_status) >= status_every_s:
-                    print(f"t={now - t0:6.1f}s step={idx} vset={psu_cfg.get('voltage')} v={vmeas} i={imeas} temp={(ens or {}).get('temp_c')}")
-                    last_status = now
-            time.sleep(1.0 / max(sample, 1e-9))
-
-    if use_parquet:
-        write_parquet(rows, out_path)
-    else:
-        fcsv.close()
+                fcsv.close()
+        finally:
+            _flush_logs(ctx)
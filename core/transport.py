@@ -1,12 +1,20 @@
 from __future__ import annotations
 import os
 import socket
+import threading
 import time
 from typing import Optional
-import json
+from .logging_io import binary_log_file, encode_log_record
 
 
 class Transport:
+    """Line-oriented SCPI transport.
+
+    Concrete transports serialize write/read/query with a per-instance lock so
+    one session can be shared between threads (e.g. overlapped instrument reads
+    in run_plan) without a command interleaving with another thread's reply.
+    """
+
     def write(self, cmd: str) -> None:
         raise NotImplementedError
 
@@ -17,6 +25,33 @@ class Transport:
         self.write(cmd)
         return self.read()
 
+    def write_many(self, cmds: list[str]) -> None:
+        """Send several commands as one SCPI compound line (one round-trip)."""
+        if cmds:
+            # ";:" restarts each header at the root; a bare ";" makes strict parsers
+            # resolve it relative to the previous header's path
+            self.write(";:".join(cmds))
+
+    def query_block(self, cmd: str) -> bytes:
+        """Send a query answered with an IEEE 488.2 definite-length block
+        (``#<n><len><data>``) and return the raw data bytes."""
+        raise NotImplementedError
+
+
+def _block_header(buf) -> Optional[tuple[int, int]]:
+    # (data offset, data length) of a "#<n><len>" block header in buf, or None
+    # while the header has not fully arrived. Anything before '#' (e.g. a
+    # "DAT2," prefix on some firmware) is skipped.
+    i = buf.find(b"#")
+    if i < 0 or len(buf) < i + 2:
+        return None
+    nd = buf[i + 1] - 0x30
+    if not 1 <= nd <= 9:
+        raise ValueError(f"Unsupported block header: {bytes(buf[i:i + 2])!r}")
+    if len(buf) < i + 2 + nd:
+        return None
+    return i + 2 + nd, int(buf[i + 2:i + 2 + nd])
+
 
 class SocketTransport(Transport):
     """Persistent TCP socket transport for SCPI.
@@ -30,15 +65,42 @@ class SocketTransport(Transport):
         self.host, self.port, self.timeout = host, port, timeout
         self.persistent = persistent
         self.connect_backoff_s = connect_backoff_s
+        self._lock = threading.RLock()
         self._sock: Optional[socket.socket] = None
+        # Buffered reader over the persistent socket; readline() runs in C
+        self._rfile = None
+        # Reused receive buffer; recv_into avoids a fresh bytes object per chunk
+        self._rx = memoryview(bytearray(65536))
+
+    def _open_socket(self) -> socket.socket:
+        s = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        s.settimeout(self.timeout)
+        # SCPI lines are tiny; don't let Nagle hold them back waiting for an ACK
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Keepalive probes stop NAT/firewall state from expiring during long idle
+        # holds; the per-socket tunables are not available on every platform
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        for opt, val in (("TCP_KEEPIDLE", 30), ("TCP_KEEPINTVL", 10), ("TCP_KEEPCNT", 3)):
+            if hasattr(socket, opt):
+                try:
+                    s.setsockopt(socket.IPPROTO_TCP, getattr(socket, opt), val)
+                except OSError:
+                    pass
+        # Room for a full scope waveform reply without extra round-trips
+        for opt in (socket.SO_RCVBUF, socket.SO_SNDBUF):
+            try:
+                s.setsockopt(socket.SOL_SOCKET, opt, 256 * 1024)
+            except OSError:
+                pass
+        return s
 
     def _connect(self) -> socket.socket:
         if self.persistent:
             if self._sock is not None:
                 return self._sock
-            s = socket.create_connection((self.host, self.port), timeout=self.timeout)
-            s.settimeout(self.timeout)
+            s = self._open_socket()
             self._sock = s
+            self._rfile = s.makefile("rb", buffering=65536)
             return s
         # Non-persistent: pace connects to avoid server refusal under rapid churn
         if self.connect_backoff_s > 0:
@@ -47,13 +109,13 @@ class SocketTransport(Transport):
             except Exception:
                 pass
         # Non-persistent: always create a fresh socket
-        s = socket.create_connection((self.host, self.port), timeout=self.timeout)
-        s.settimeout(self.timeout)
-        return s
+        return self._open_socket()
 
     def _close(self, sock: Optional[socket.socket] = None) -> None:
         try:
             if self.persistent:
+                if self._rfile is not None:
+                    self._rfile.close()
                 if self._sock is not None:
                     self._sock.close()
             else:
@@ -62,6 +124,7 @@ class SocketTransport(Transport):
         finally:
             if self.persistent:
                 self._sock = None
+                self._rfile = None
 
     def _send(self, payload: bytes) -> Optional[socket.socket]:
         s = self._connect()
@@ -83,13 +146,14 @@ class SocketTransport(Transport):
                 s.sendall(payload)
         return s if not self.persistent else None
 
-    def _recv_until_nl(self, sock: Optional[socket.socket] = None) -> bytes:
+    def _recv_until_nl(self, sock: Optional[socket.socket] = None) -> bytearray:
         s = sock if (sock is not None) else self._connect()
-        data = b""
+        rx = self._rx
+        data = bytearray()
         deadline = time.time() + max(self.timeout, 1.0) * 2.5
         while True:
             try:
-                chunk = s.recv(4096)
+                n = s.recv_into(rx)
             except Exception as exc:
                 # allow a few timeout retries if we're mid-message
                 if (isinstance(exc, TimeoutError) or isinstance(exc, socket.timeout)) and time.time() < deadline:
@@ -97,9 +161,9 @@ class SocketTransport(Transport):
                 # On read failure, close to reset session for next command
                 self._close(s if not self.persistent else None)
                 raise
-            if not chunk:
+            if not n:
                 break
-            data += chunk
+            data += rx[:n]
             if data.endswith(b"\n"):
                 break
             if time.time() >= deadline:
@@ -109,33 +173,117 @@ class SocketTransport(Transport):
 
     def write(self, cmd: str) -> None:
         payload = (cmd + "\n").encode()
-        if self.persistent:
-            self._send(payload)
-        else:
-            s = self._send(payload)
-            try:
-                self._close(s)
-            except Exception:
-                pass
+        with self._lock:
+            if self.persistent:
+                self._send(payload)
+            else:
+                s = self._send(payload)
+                try:
+                    self._close(s)
+                except Exception:
+                    pass
+
+    def _readline(self) -> bytes:
+        s = self._connect()
+        # Give a slow reply the same budget the recv loop allows (2.5x timeout)
+        s.settimeout(max(self.timeout, 1.0) * 2.5)
+        try:
+            return self._rfile.readline()
+        except Exception:
+            # A buffered reader that hit a timeout cannot be reused; reset the session
+            self._close()
+            raise
+        finally:
+            if self._sock is not None:
+                self._sock.settimeout(self.timeout)
 
     def read(self) -> str:
-        out = self._recv_until_nl()
-        return out.decode().strip() if out else ""
+        with self._lock:
+            if self.persistent:
+                return self._readline().decode().strip()
+            out = self._recv_until_nl()
+            return out.decode().strip() if out else ""
 
     def query(self, cmd: str) -> str:
         payload = (cmd + "\n").encode()
-        if self.persistent:
-            self._send(payload)
-            return self.read()
-        s = self._send(payload)
+        with self._lock:
+            if self.persistent:
+                self._send(payload)
+                return self.read()
+            s = self._send(payload)
+            try:
+                out = self._recv_until_nl(s)
+                return out.decode().strip() if out else ""
+            finally:
+                try:
+                    self._close(s)
+                except Exception:
+                    pass
+
+    def _read_block(self) -> bytes:
+        # Persistent session: pull exact sizes through the buffered reader
+        rf = self._rfile
+        head = bytearray()
+        while (hdr := _block_header(head)) is None:
+            b = rf.read(1)
+            if not b:
+                raise ConnectionError("Connection closed before block header")
+            head += b
+        data = rf.read(hdr[1])
+        if len(data) < hdr[1]:
+            raise ConnectionError(f"Short block: {len(data)} of {hdr[1]} bytes")
+        # Drop terminators that have already arrived (Siglent X-E sends "\n\n") so
+        # the next readline() starts clean. Never wait for more: with the socket
+        # non-blocking, peek() only sees what is buffered or readable right now.
+        sock = self._sock
         try:
-            out = self._recv_until_nl(s)
-            return out.decode().strip() if out else ""
+            sock.settimeout(0)
+            while rf.peek(1)[:1] in (b"\r", b"\n"):
+                rf.read(1)
+        except Exception:
+            pass
         finally:
             try:
-                self._close(s)
+                sock.settimeout(self.timeout)
             except Exception:
                 pass
+        return data
+
+    def _recv_block(self, s: socket.socket) -> bytes:
+        rx = self._rx
+        data = bytearray()
+        hdr = None
+        while hdr is None or len(data) < hdr[0] + hdr[1]:
+            n = s.recv_into(rx)
+            if not n:
+                break
+            data += rx[:n]
+            if hdr is None:
+                hdr = _block_header(data)
+        if hdr is None or len(data) < hdr[0] + hdr[1]:
+            raise ConnectionError("Connection closed mid-block")
+        return bytes(data[hdr[0]:hdr[0] + hdr[1]])
+
+    def query_block(self, cmd: str) -> bytes:
+        payload = (cmd + "\n").encode()
+        with self._lock:
+            if self.persistent:
+                self._send(payload)
+                self._connect()
+                try:
+                    return self._read_block()
+                except Exception:
+                    # A partly consumed block leaves the session out of sync
+                    self._close()
+                    raise
+            s = self._send(payload)
+            try:
+                return self._recv_block(s)
+            finally:
+                try:
+                    self._close(s)
+                except Exception:
+                    pass
 
     def set_timeout(self, timeout: float) -> None:
         """Adjust socket timeout for subsequent operations."""
@@ -150,7 +298,8 @@ class SocketTransport(Transport):
 class USBTMCTransport(Transport):
     """Persistent Linux USBTMC character-device transport.
 
-    Uses a single read/write handle to the `/dev/usbtmcX` device. Implements
+    Uses a single raw read/write file descriptor on the `/dev/usbtmcX` device
+    (os.read/os.write, bypassing the io module's file layer). Implements
     simple retry-once semantics on write failure and resets the handle on
     read failures to recover from stalled sessions.
     """
@@ -159,11 +308,12 @@ class USBTMCTransport(Transport):
         self.path = path
         self.timeout_s = timeout_s
         self.inter_query_delay_s = inter_query_delay_s
-        self._f: Optional[object] = None
+        self._lock = threading.RLock()
+        self._fd: Optional[int] = None
 
-    def _open(self):
-        if self._f is not None:
-            return self._f
+    def _open(self) -> int:
+        if self._fd is not None:
+            return self._fd
         # Try to extend kernel usbtmc timeout via sysfs if available
         try:
             base = os.path.basename(self.path)
@@ -182,75 +332,101 @@ class USBTMCTransport(Transport):
                     fp.write("1")
         except Exception:
             pass
-        # Open once for read/write in binary mode, unbuffered
-        self._f = open(self.path, "r+b", buffering=0)
-        return self._f
+        # Open once for read/write; a character device needs no io-module buffering
+        self._fd = os.open(self.path, os.O_RDWR)
+        return self._fd
 
     def _close(self) -> None:
-        try:
-            if self._f is not None:
-                try:
-                    self._f.close()
-                finally:
-                    self._f = None
-        finally:
-            self._f = None
+        fd, self._fd = self._fd, None
+        if fd is not None:
+            os.close(fd)
 
     def write(self, cmd: str) -> None:
         payload = (cmd + "\n").encode()
         last_exc: Optional[Exception] = None
-        for attempt in range(3):
-            f = self._open()
-            try:
-                f.write(payload)
-                return
-            except Exception as exc:
-                last_exc = exc
-                # retry after short delay and reopen
-                self._close()
-                time.sleep(0.05)
+        with self._lock:
+            for attempt in range(3):
+                fd = self._open()
+                try:
+                    os.write(fd, payload)
+                    return
+                except Exception as exc:
+                    last_exc = exc
+                    # retry after short delay and reopen
+                    self._close()
+                    time.sleep(0.05)
         # if we exhausted retries, re-raise the last error
         assert last_exc is not None
         raise last_exc
 
     def read(self) -> str:
-        f = self._open()
         # Try a couple of times in case the device needs a moment
         last_exc: Optional[Exception] = None
-        for _ in range(3):
-            try:
-                data = f.read(65536)
-                if data:
-                    return data.decode(errors="ignore").strip()
-                # empty read; brief wait then retry
-                time.sleep(0.02)
-            except Exception as exc:
-                last_exc = exc
-                # reset on read failure so that subsequent operations can recover
-                self._close()
-                time.sleep(0.02)
+        with self._lock:
+            for _ in range(3):
+                # Reopen each attempt: a failed read closes the descriptor
+                fd = self._open()
+                try:
+                    data = os.read(fd, 65536)
+                    if data:
+                        return data.decode(errors="ignore").strip()
+                    # empty read; brief wait then retry
+                    time.sleep(0.02)
+                except Exception as exc:
+                    last_exc = exc
+                    # reset on read failure so that subsequent operations can recover
+                    self._close()
+                    time.sleep(0.02)
         if last_exc:
             raise last_exc
         return ""
 
     def query(self, cmd: str) -> str:
-        self.write(cmd)
-        if self.inter_query_delay_s > 0:
-            time.sleep(self.inter_query_delay_s)
-        return self.read()
+        with self._lock:
+            self.write(cmd)
+            if self.inter_query_delay_s > 0:
+                time.sleep(self.inter_query_delay_s)
+            return self.read()
+
+    def query_block(self, cmd: str) -> bytes:
+        with self._lock:
+            self.write(cmd)
+            if self.inter_query_delay_s > 0:
+                time.sleep(self.inter_query_delay_s)
+            fd = self._open()
+            data = bytearray()
+            hdr = None
+            try:
+                # The device may split the block over several transfers
+                while hdr is None or len(data) < hdr[0] + hdr[1]:
+                    chunk = os.read(fd, 65536)
+                    if not chunk:
+                        raise ConnectionError("USBTMC reply ended mid-block")
+                    data += chunk
+                    if hdr is None:
+                        hdr = _block_header(data)
+            except Exception:
+                self._close()
+                raise
+            return bytes(data[hdr[0]:hdr[0] + hdr[1]])
+
+
+# Several LoggingTransports usually share one log file and may log from different threads
+_LOG_LOCK = threading.Lock()
 
 
 class LoggingTransport(Transport):
     """Transparent logging wrapper around another Transport.
 
-    Writes newline-delimited JSON records to the provided file-like object.
-    Records include timestamp seconds, role, op (write/read), remote, and data.
+    Writes newline-delimited JSON records to the provided binary file-like
+    object (a text-mode file is written through its ``buffer``). Records
+    include timestamp seconds, role, op (write/read), remote, and data.
     """
 
     def __init__(self, inner: Transport, role: str, log_file):
         self.inner = inner
         self.role = role
-        self.log_file = log_file
+        self.log_file = binary_log_file(log_file)
         self.remote = self._detect_remote()
 
         # Log an open event
@@ -274,15 +450,22 @@ class LoggingTransport(Transport):
             rec = {"ts": time.time(), "role": self.role, "op": op, "remote": self.remote, "data": data}
             if extra:
                 rec.update(extra)
-            self.log_file.write(json.dumps(rec, separators=(",", ":")) + "\n")
-            try:
-                self.log_file.flush()
-            except Exception:
-                pass
+            line = encode_log_record(rec)
+            # No per-record flush: the file is buffered and flushed via flush()
+            with _LOG_LOCK:
+                self.log_file.write(line)
         except Exception:
             # Never let logging break I/O
             pass
 
+    def flush(self) -> None:
+        """Push buffered log records to the OS."""
+        try:
+            with _LOG_LOCK:
+                self.log_file.flush()
+        except Exception:
+            pass
+
     # Delegate attribute access for non-Transport APIs (e.g., set_timeout)
     def __getattr__(self, item):
         return getattr(self.inner, item)
@@ -295,3 +478,17 @@ class LoggingTransport(Transport):
         resp = self.inner.read()
         self._log("read", resp)
         return resp
+
+    def query(self, cmd: str) -> str:
+        # Delegate as one call so the inner transport's lock covers write+read
+        self._log("write", cmd)
+        resp = self.inner.query(cmd)
+        self._log("read", resp)
+        return resp
+
+    def query_block(self, cmd: str) -> bytes:
+        self._log("write", cmd)
+        data = self.inner.query_block(cmd)
+        # Binary payloads are summarized rather than dumped into the text log
+        self._log("read", f"<block {len(data)} bytes>")
+        return data
@@ -1,19 +1,46 @@
 from __future__ import annotations
-import serial, time, re, json
+import asyncio, serial, time, re
+from core.logging_io import binary_log_file, dumps_bytes
+
+
+def _crc7_table_entry(chunk: int) -> int:
+    # CRC7 (poly x^7+x^3+1, zero init) of one 7-bit chunk, via the bit-serial loop
+    crc = chunk
+    for _ in range(7):
+        crc = ((crc << 1) ^ 0x09) & 0x7F if crc & 0x40 else (crc << 1)
+    return crc
+
+# 7-bits-at-a-time lookup table for the ENS210 CRC7; the chunk width equals the
+# CRC width, so each step is a single TABLE[crc ^ chunk]
+_CRC7_TABLE = tuple(_crc7_table_entry(i) for i in range(128))
+
+_HEX_PAIR_RE = re.compile(r"\b([0-9a-fA-F]{2})\b")
+
 
 class ENS210Serial:
+    # Hot-path dongle commands, pre-encoded once
+    _CMD_START = b"i2c raw 22 03\n"   # SENS_START: single-shot T and H
+    _CMD_READ = b"i2c raw 30 r6\n"    # read T_VAL/H_VAL (6 bytes)
+    # Fixed-shape NDJSON log record; only ts, op and data vary
+    _LOG_FMT = b'{"ts":%.6f,"role":"ens210","op":"%s","remote":%s,"data":%s}\n'
+    _LOG_FLUSH_EVERY = 64
+
     def __init__(self, port: str, addr: int = 0x43, baud: int = 115200, timeout: float = 0.5, ignore_crc: bool = False, log_file=None):
         self.port = port; self.addr = addr; self.dev8 = (addr << 1) & 0xFE
         self.ignore_crc = ignore_crc
-        self.log = log_file
+        # Records are bytes; a text-mode file is written through its buffer
+        self.log = binary_log_file(log_file)
+        self._log_remote = dumps_bytes(port)
+        self._log_count = 0
         self.ser = serial.Serial(port, baudrate=baud, timeout=timeout)
-        self._write("\n"); time.sleep(0.1)
+        self._write("\n"); self._wait_prompt()
         # Configure I2C options once; values are hex without 0x prefix on this dongle
         out = self._query(f"i2c opt dev {self.dev8:02X} asize 1 vsize 1 speed 100000")
         if "error" in (out or "").lower():
-            self._query(f"i2c opt dev {self.addr:02X} asize 1 vsize 1 speed 100000")
-        # Small delay then scan to wake firmware
-        time.sleep(0.05)
+            out = self._query(f"i2c opt dev {self.addr:02X} asize 1 vsize 1 speed 100000")
+        # Let the dongle settle back to its prompt, then scan to wake firmware
+        if ">" not in out:
+            self._wait_prompt()
         self._query("i2c scan")
 
     def close(self):
@@ -22,31 +49,37 @@ class ENS210Serial:
 
     def _write(self, s: str):
         if not s.endswith("\n"): s += "\n"
-        self.ser.write(s.encode("ascii"))
-        self._log("write", s.strip())
+        self._send(s.encode("ascii"))
+
+    def _send(self, payload: bytes) -> None:
+        self.ser.write(payload)
+        if self.log:
+            self._log("write", payload.decode("ascii").strip())
+
+    def _read_raw(self, cap_s: float = 0.4) -> bytes:
+        ser = self.ser
+        ser.flush()
+        # Block in the OS until the reply (possibly preceded by the echoed
+        # command) ends at the dongle's '>' prompt. pyserial applies the port
+        # timeout to the whole read_until call, so cap_s bounds a silent dongle.
+        old = ser.timeout
+        if old != cap_s:
+            ser.timeout = cap_s
+        try:
+            buf = ser.read_until(b">")
+        finally:
+            if old != cap_s:
+                ser.timeout = old
+        if buf and self.log:
+            self._log("read", buf.decode(errors="ignore").strip())
+        return bytes(buf)
 
     def _read_all(self) -> str:
-        self.ser.flush()
-        chunks = []
-        deadline = time.time() + 0.4
-        last_data_ts = time.time()
-        while time.time() < deadline:
-            ch = self.ser.read(256)
-            if ch:
-                chunks.append(ch)
-                last_data_ts = time.time()
-                # If we received a newline and buffer is momentarily empty, allow a brief settle
-                if b"\n" in ch:
-                    time.sleep(0.01)
-            else:
-                # No immediate data; if we've been idle for 100ms and past deadline margin, break
-                if (time.time() - last_data_ts) > 0.1 and time.time() > (deadline - 0.2):
-                    break
-                time.sleep(0.01)
-        out = b"".join(chunks).decode(errors="ignore")
-        if out:
-            self._log("read", out.strip())
-        return out
+        return self._read_raw().decode(errors="ignore")
+
+    def _wait_prompt(self, cap_s: float = 0.2) -> None:
+        # Consume output up to the prompt; a silent dongle costs at most cap_s
+        self._read_raw(cap_s)
 
     def _query(self, s: str) -> str:
         self._write(s); return self._read_all()
@@ -55,48 +88,33 @@ class ENS210Serial:
         if not self.log:
             return
         try:
-            rec = {"ts": time.time(), "role": "ens210", "op": op, "remote": self.port, "data": data}
-            self.log.write(json.dumps(rec, separators=(",", ":")) + "\n")
-            try:
+            # The debug log is shared with LoggingTransport and written as bytes
+            self.log.write(self._LOG_FMT % (time.time(), op.encode(), self._log_remote, dumps_bytes(data)))
+            self._log_count += 1
+            if self._log_count % self._LOG_FLUSH_EVERY == 0:
                 self.log.flush()
-            except Exception:
-                pass
         except Exception:
             pass
 
-    def _ensure_opt(self) -> None:
-        # Leave device selection sticky per user guidance; do not re-send each transaction
-        return
-
-    @staticmethod
-    def _crc7(val: int) -> int:
-        CRC7POLY=0x89; CRC7WIDTH=7; CRC7IVEC=0x7F; DATA7WIDTH=17
-        pol = CRC7POLY << (DATA7WIDTH - CRC7WIDTH - 1)
-        bit = 1 << (DATA7WIDTH - 1)
-        v = (val << CRC7WIDTH); pol <<= CRC7WIDTH; v |= CRC7IVEC
-        while bit >= 1:
-            if (v & (bit << CRC7WIDTH)): v ^= pol
-            bit >>= 1; pol >>= 1
-        return v & ((1<<CRC7WIDTH)-1)
-
-    @staticmethod
-    def _decode(val24: int):
-        data = (val24 >> 0) & 0xFFFF
-        valid = (val24 >> 16) & 0x1
-        crc = (val24 >> 17) & 0x7F
-        payl = (val24 >> 0) & 0x1FFFF
-        crc_ok = (ENS210Serial._crc7(payl) == crc)
-        return data, bool(valid), crc_ok
+    def flush(self) -> None:
+        """Push buffered log records to the OS."""
+        if self.log:
+            try: self.log.flush()
+            except Exception: pass
 
     @staticmethod
-    def _try_alternate_decode(b0: int, b1: int, b2: int):
-        # Try alternate byte order if CRC fails: MSB-first
-        val24 = (b0 << 16) | (b1 << 8) | b2
-        return ENS210Serial._decode(val24), val24
+    def _decode(val24: int, _T=_CRC7_TABLE):
+        # T_VAL/H_VAL word: data[15:0], valid[16], crc[23:17]. The CRC7 runs over
+        # the 17-bit payload fed as 3+7+7 bit chunks through the table; the
+        # datasheet's 0x7F init vector sits below the payload bits, so it
+        # reduces to a final XOR.
+        r = _T[_T[_T[(val24 >> 14) & 0x7] ^ ((val24 >> 7) & 0x7F)] ^ (val24 & 0x7F)]
+        return val24 & 0xFFFF, bool(val24 & 0x10000), (r ^ 0x7F) == ((val24 >> 17) & 0x7F)
 
     def start_single_shot(self):
         # Prefer raw command on this dongle; fall back to others
-        resp = self._query("i2c raw 22 03")
+        self._send(self._CMD_START)
+        resp = self._read_all()
         if not resp:
             resp = self._query("i 22 03")
         if not resp:
@@ -104,40 +122,46 @@ class ENS210Serial:
 
     def read_t_h_raw(self):
         # This dongle supports combined raw write+read: 'i2c raw 30 r6'
-        resp = self._query("i2c raw 30 r6")
+        self._send(self._CMD_READ)
+        resp = self._read_raw()
         # Parse a line like: "i2c: raw dev 86: f6 4c e3 54 12 34 error=none"
-        line = None
-        for ln in (resp or "").splitlines():
-            if ln.strip().startswith("i2c: raw dev"):
-                line = ln; break
-        if not line:
-            # Last resort: extract any hex pairs from resp
-            hexbytes = re.findall(r"\b([0-9a-fA-F]{2})\b", resp or "")
+        # in one pass: the six pairs follow the colon after the device address
+        b = None
+        i = resp.find(b"raw dev")
+        j = resp.find(b":", i + 7) if i >= 0 else -1
+        if j >= 0:
+            pairs = resp[j + 1:j + 19].split()
+            if len(pairs) == 6 and all(len(p) == 2 for p in pairs):
+                try:
+                    b = [int(p, 16) for p in pairs]
+                except ValueError:
+                    b = None
+        if b is None:
+            # Last resort: extract hex pairs after the 'dev XX:' token, or from the
+            # whole reply when there is no 'raw dev' line at all
+            tail = resp[j + 1:] if j >= 0 else resp
+            hexbytes = _HEX_PAIR_RE.findall(tail.decode(errors="ignore"))
             if len(hexbytes) < 6:
                 raise RuntimeError("No read data from dongle")
             b = [int(x,16) for x in hexbytes[:6]]
-        else:
-            # Only parse bytes after the last colon to skip the 'dev XX:' token
-            payload = line.split(":")[-1]
-            hexbytes = re.findall(r"\b([0-9a-fA-F]{2})\b", payload)
-            b = [int(x,16) for x in hexbytes if re.fullmatch(r"[0-9a-fA-F]{2}", x)][:6]
         t_val = (b[2]<<16)|(b[1]<<8)|b[0]
         h_val = (b[5]<<16)|(b[4]<<8)|b[3]
         return t_val, h_val
 
     def read(self):
         self.start_single_shot(); time.sleep(0.12)
-        t_raw, h_raw = self.read_t_h_raw()
+        return self._convert(*self.read_t_h_raw())
+
+    async def read_async(self):
+        """Like read(), but awaits the conversion time instead of blocking, so
+        several sensors can be sampled concurrently from one event loop."""
+        await asyncio.to_thread(self.start_single_shot)
+        await asyncio.sleep(0.12)
+        return self._convert(*await asyncio.to_thread(self.read_t_h_raw))
+
+    def _convert(self, t_raw: int, h_raw: int) -> dict:
         t_data, t_valid, t_crc_ok = self._decode(t_raw)
         h_data, h_valid, h_crc_ok = self._decode(h_raw)
-        if not t_crc_ok:
-            (alt_t, alt_valid, alt_crc_ok), alt_val = self._try_alternate_decode((t_raw>>16)&0xFF, (t_raw>>8)&0xFF, t_raw&0xFF)
-            if alt_crc_ok:
-                t_data, t_valid, t_crc_ok = alt_t, alt_valid, alt_crc_ok
-        if not h_crc_ok:
-            (alt_h, alt_valid_h, alt_crc_ok_h), alt_val_h = self._try_alternate_decode((h_raw>>16)&0xFF, (h_raw>>8)&0xFF, h_raw&0xFF)
-            if alt_crc_ok_h:
-                h_data, h_valid, h_crc_ok = alt_h, alt_valid_h, alt_crc_ok_h
         t_k = t_data / 64.0; t_c = t_k - 273.15; rh = h_data / 512.0
         ok = t_valid and h_valid and (t_crc_ok and h_crc_ok or self.ignore_crc)
         return {"temp_c": t_c, "temp_k": t_k, "rh_pct": rh, "ok": ok,
@@ -2,19 +2,17 @@ from __future__ import annotations
 from core.instrument import Instrument
 import re
 
+_FLOAT_RE = re.compile(r"[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?")
+
 class SDM3045X(Instrument):
     def set_function(self, function: str = "VOLT:DC", rng: float | None = None) -> None:
         self._last_function = function
-        self.t.write(f'FUNC "{function}"')
+        cmds = [f'FUNC "{function}"']
         if function.upper().startswith("VOLT:DC"):
-            self.t.write("CONF:VOLT:DC" + (f" {rng}" if rng is not None else ""))
+            cmds.append("CONF:VOLT:DC" + (f" {rng}" if rng is not None else ""))
         # Ensure a simple immediate trigger and single sample for READ?
-        try:
-            self.t.write("TRIG:COUN 1")
-            self.t.write("TRIG:SOUR IMM")
-            self.t.write("SAMP:COUN 1")
-        except Exception:
-            pass
+        cmds += ["TRIG:COUN 1", "TRIG:SOUR IMM", "SAMP:COUN 1"]
+        self.t.write_many(cmds)
     def read(self) -> float:
         # Some SDM firmware revisions may require FETCH? after triggering
         # Ensure a fresh initiation sequence
@@ -29,7 +27,7 @@ class SDM3045X(Instrument):
             resp = self.t.query("MEAS:VOLT:DC?")
         # Extract first float from response to be robust to extra tokens
         if resp:
-            m = re.search(r"[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?", resp)
+            m = _FLOAT_RE.search(resp)
             if m:
                 return float(m.group(0))
         # If still nothing, surface instrument error if any
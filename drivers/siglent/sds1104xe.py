@@ -1,10 +1,13 @@
 from __future__ import annotations
 from core.instrument import Instrument
+from itertools import islice
 from typing import Literal
 import re
 
 Chan = Literal["C1","C2","C3","C4"]
 
+_FLOAT_RE = re.compile(r"[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?")
+
 class SDS1104XE(Instrument):
     def run(self):  self.t.write("RUN")
     def stop(self): self.t.write("STOP")
@@ -15,18 +18,18 @@ class SDS1104XE(Instrument):
         if scale is not None:  parts.append(f"{ch}:SCAL {scale}")
         if offset is not None: parts.append(f"{ch}:OFFS {offset}")
         if probe is not None:  parts.append(f"{ch}:PROB {probe}")
-        self.t.write("; ".join(parts))
+        self.t.write_many(parts)
     def set_timebase(self, scale_s_div: float, points: int|None=None):
         parts: list[str] = [f"TDIV {scale_s_div}"]
         if points is not None: parts.append(f"ACQ:MEMD {points}")
-        self.t.write("; ".join(parts))
+        self.t.write_many(parts)
     def set_trigger_edge(self, src: Chan, level: float, slope: str="POS"):
-        self.t.write("; ".join([
+        self.t.write_many([
             "TRIG:MODE EDGE",
             f"TRIG:EDGE:SOUR {src}",
             f"TRIG:EDGE:SLOP {slope}",
             f"TRIG:LEV {level}",
-        ]))
+        ])
     def _ensure_measurement_enabled(self) -> None:
         if getattr(self, "_meas_enabled", False):
             return
@@ -40,8 +43,7 @@ class SDS1104XE(Instrument):
         # Prefer PAVA since it often returns reliably as labeled text
         resp = self.t.query(f"{ch}:PAVA? {item}")
         # Expected like: "C1:PAVA VPP,3.2000V" -> extract first float
-        import re
-        m = re.search(r"[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?", resp or "")
+        m = _FLOAT_RE.search(resp or "")
         if not m:
             raise RuntimeError(f"Unexpected PAVA response: {resp!r}")
         return float(m.group(0))
@@ -72,14 +74,13 @@ class SDS1104XE(Instrument):
     def get_waveform(self, ch: Chan) -> tuple[list[float], list[float]]:
         # Configure waveform parameters and pause acquisition for a consistent read
         self.t.write("STOP")
-        self.t.write("WAV:MODE NORM"); self.t.write("WAV:FORM ASC"); self.t.write(f"WAV:SOUR {ch}")
+        # Signed 8-bit samples in one binary block instead of comma-separated ASCII
+        self.t.write("WAV:MODE NORM"); self.t.write("WAV:FORM BYTE"); self.t.write(f"WAV:SOUR {ch}")
         # Limit returned points to keep responses fast and reliable
         try:
             self.t.write("WAV:POIN 1200")
         except Exception:
             pass
-        # Ensure previous configuration commands are processed before querying
-        _ = self.t.query("*OPC?")
         # Preamble may be large; increase timeout if supported
         try:
             self.t.set_timeout(10.0)  # type: ignore[attr-defined]
@@ -87,8 +88,17 @@ class SDS1104XE(Instrument):
             pass
         try:
             pre = self.t.query("WAV:PRE?")
-            # Extract the first six floats from preamble (XINC, XORIG, XREF, YINC, YORIG, YREF)
-            nums = [float(m.group(0)) for m in re.finditer(r"[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?", pre)]
+            # First six fields of the preamble: XINC, XORIG, XREF, YINC, YORIG, YREF.
+            # Plain comma-separated numbers split directly; an echoed header
+            # ("WAV:PRE 1.0E-06,...") is dropped from the first field.
+            fields = pre.split(",", 6)[:6]
+            head = fields[0].split()
+            fields[0] = head[-1] if head else ""
+            try:
+                nums = [float(f) for f in fields]
+            except ValueError:
+                # Fields with units or labels: scan for the first six numbers instead
+                nums = [float(m.group(0)) for m in islice(_FLOAT_RE.finditer(pre), 6)]
             if len(nums) < 6:
                 raise RuntimeError("incomplete preamble")
             xinc, xorig, xref, yinc, yorig, yref = nums[:6]
@@ -111,9 +121,10 @@ class SDS1104XE(Instrument):
                 yref = qf("WAV:YREF?")
             except Exception:
                 yref = 0.0
-        raw = self.t.query("WAV:DATA?")
-        ys = [float(v) for v in raw.split(",") if v.strip()]
-        xs=[xorig+i*xinc for i in range(len(ys))]; vs=[(p-yref)*yinc+yorig for p in ys]
+        # View the block as int8 codes in place; no text parsing per sample
+        codes = memoryview(self.t.query_block("WAV:DATA?")).cast("b")
+        xs = [xorig + i * xinc for i in range(len(codes))]
+        vs = [(p - yref) * yinc + yorig for p in codes]
         try:
             self.t.write("RUN")
         except Exception:
@@ -1,10 +1,13 @@
 from __future__ import annotations
 from core.instrument import Instrument
+from typing import ClassVar
 
 
 class SPD3303XE(Instrument):
     """Siglent SPD3303X-E power supply SCPI driver."""
 
+    _CHNUM: ClassVar[dict[str, int]] = {"CH1": 1, "CH2": 2, "CH3": 3}
+
     def set_voltage(self, channel: str, voltage_v: float) -> None:
         # Explicit channel addressing is the most compatible across firmwares
         self.t.write(f"{channel}:VOLT {voltage_v}")
@@ -12,36 +15,86 @@ class SPD3303XE(Instrument):
     def set_current(self, channel: str, current_a: float) -> None:
         self.t.write(f"{channel}:CURR {current_a}")
 
+    def set_levels(self, channel: str, voltage_v: float | None = None, current_a: float | None = None) -> None:
+        """Set current limit and/or voltage in a single compound write."""
+        cmds = []
+        if current_a is not None:
+            cmds.append(f"{channel}:CURR {current_a}")
+        if voltage_v is not None:
+            cmds.append(f"{channel}:VOLT {voltage_v}")
+        self.t.write_many(cmds)
+
     def measure_voltage(self, channel: str) -> float:
         return float(self.t.query(f"MEAS:VOLT? {channel}"))
 
     def measure_current(self, channel: str) -> float:
         return float(self.t.query(f"MEAS:CURR? {channel}"))
 
-    def output_on(self, channel: str) -> None:
-        # Some firmware revisions require remote mode and different output syntaxes
-        # Try a handful of compatible enables to cover variations
-        chnum = {"CH1": 1, "CH2": 2, "CH3": 3}.get(channel.upper())
+    # Output-enable syntaxes seen across firmware revisions, tried in this order.
+    # {ch} is the channel name ("CH1"), {n} its number.
+    _ENABLE_CANDIDATES = (
+        ("OUTP {ch},ON",),                              # per-channel on
+        ("SYST:REM", "INST {ch}", "OUTP ON"),           # master output on
+        ("SYST:REM", "INST {ch}", "OUTPut:STATe ON"),   # alternate master syntax
+        ("OUTPut{n}:STATe ON",),                        # alternate per-channel syntax
+    )
+
+    @staticmethod
+    def _no_error(resp: str) -> bool:
+        # "0,No error" (or "0  No Error") -> True
         try:
-            self.t.write("SYST:REM")
-        except Exception:
-            pass
+            return int(resp.replace(",", " ").split()[0]) == 0
+        except (ValueError, IndexError):
+            return False
+
+    @staticmethod
+    def _enable_cmds(cand: tuple[str, ...], channel: str, chnum: int | None) -> list[str] | None:
+        # None when the syntax needs a channel number this channel does not have
+        if chnum is None and any("{n}" in c for c in cand):
+            return None
+        return [c.format(ch=channel, n=chnum) for c in cand]
+
+    def _probe_enable_cmd(self, channel: str, chnum: int | None) -> tuple[str, ...] | None:
+        # Run each candidate once and keep the first one the PSU accepts cleanly
         try:
-            self.t.write(f"INST {channel}")
+            for cand in self._ENABLE_CANDIDATES:
+                cmds = self._enable_cmds(cand, channel, chnum)
+                if cmds is None:
+                    continue
+                # Empty the error queue first so a leftover error from an earlier
+                # candidate is not charged to this one
+                self.clear()
+                self.t.write_many(cmds)
+                if self._no_error(self.t.query("SYST:ERR?")):
+                    return cand
         except Exception:
             pass
-        for cmd in [
-            "OUTP ON",                      # master output on
-            f"OUTP {channel},ON",           # per-channel on
-            "OUTPut:STATe ON",              # alternate master syntax
-            (f"OUTPut{chnum}:STATe ON" if chnum else None),  # alternate per-channel syntax
-        ]:
-            if not cmd:
-                continue
-            try:
-                self.t.write(cmd)
-            except Exception:
-                pass
+        return None
+
+    def output_on(self, channel: str) -> None:
+        chnum = self._CHNUM.get(channel.upper())
+        if not hasattr(self, "_enable_cmd"):
+            # Probing already enables the output on success
+            self._enable_cmd = self._probe_enable_cmd(channel, chnum)
+            if self._enable_cmd is not None:
+                return
+        cmds = self._enable_cmds(self._enable_cmd, channel, chnum) if self._enable_cmd else None
+        if cmds:
+            self.t.write_many(cmds)
+            return
+        # No syntax probed clean: send every variant as one compound line. The
+        # documented per-channel form goes first so a parser that drops the
+        # rest of a line after an unknown command has still enabled the output.
+        cmds = [
+            f"OUTP {channel},ON",
+            "SYST:REM",
+            f"INST {channel}",
+            "OUTP ON",
+            "OUTPut:STATe ON",
+        ]
+        if chnum:
+            cmds.append(f"OUTPut{chnum}:STATe ON")
+        self.t.write_many(cmds)
         # Optional: block until operations complete if supported
         try:
             _ = self.t.query("*OPC?")
@@ -2,45 +2,84 @@ from __future__ import annotations
 import argparse, socket, threading, time, random
 
 
+def _run_line(handler, line: str):
+    # SCPI compound lines: "A;:B" runs A then B, replies are ';'-joined
+    resps = []
+    for c in line.split(";"):
+        try:
+            r = handler(c.strip().lstrip(":"))
+        except Exception:
+            # A malformed command must not take the server down with it
+            r = "-100,Command error"
+        if r is not None: resps.append(r)
+    return ";".join(resps) + "\n" if resps else ""
+
+
 def serve(bind: str, handler):
     host, port = bind.split(":"); port = int(port)
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    # Sized for bulk replies; accepted sockets inherit the buffer sizes
+    for opt in (socket.SO_RCVBUF, socket.SO_SNDBUF):
+        sock.setsockopt(socket.SOL_SOCKET, opt, 64 * 1024)
     sock.bind((host, port)); sock.listen(5)
     print(f"Mock server listening on {bind}")
     while True:
         conn, _ = sock.accept()
-        data = b""
-        while True:
-            chunk = conn.recv(4096)
-            if not chunk: break
-            data += chunk
-            if data.endswith(b"\n"): break
-        cmd = data.decode().strip()
-        resp = handler(cmd)
-        if resp is not None: conn.sendall((resp + "\n").encode())
-        conn.close()
+        # Replies are tiny; don't let Nagle delay them and skew measured latency
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # A client that never finishes its line fails fast instead of wedging the server
+        conn.settimeout(1.0)
+        try:
+            buf = bytearray()
+            while True:
+                chunk = conn.recv(4096)
+                if not chunk: break
+                buf.extend(chunk)
+                if buf.endswith(b"\n"): break
+            # A client may pipeline several lines before the server reads; answer each
+            out = "".join(_run_line(handler, ln.strip()) for ln in buf.decode(errors="replace").split("\n") if ln.strip())
+            if out: conn.sendall(out.encode())
+        except OSError:
+            pass
+        finally:
+            conn.close()
 
 
 def spd_handler():
     state = {"idn":"SIGLENT,SPD3303X-E,MOCK,1.00","CH1":{"V":5.0,"I":1.0,"ON":False}}
+    ch1 = state["CH1"]
+    # Exact commands resolve by table lookup; callables give state-dependent replies
+    static = {
+        "*IDN?": state["idn"],
+        "MEAS:VOLT? CH1": lambda: f"{ch1['V'] - (0.01 if ch1['ON'] else 0.0):.6f}",
+        "MEAS:CURR? CH1": lambda: f"{(ch1['I'] if ch1['ON'] else 0.0):.6f}",
+        "OUTP CH1,ON": lambda: ch1.update(ON=True),
+        "OUTP CH1,OFF": lambda: ch1.update(ON=False),
+        "SYST:ERR?": "0,No error",
+        "*CLS": lambda: None,
+    }
     def h(cmd: str):
-        if cmd == "*IDN?": return state["idn"]
-        if cmd.startswith("CH1:VOLT "): state["CH1"]["V"] = float(cmd.split()[-1]); return None
-        if cmd.startswith("CH1:CURR "): state["CH1"]["I"] = float(cmd.split()[-1]); return None
-        if cmd == "MEAS:VOLT? CH1": v = state["CH1"]["V"] - (0.01 if state["CH1"]["ON"] else 0.0); return f"{v:.6f}"
-        if cmd == "MEAS:CURR? CH1": i = state["CH1"]["I"] if state["CH1"]["ON"] else 0.0; return f"{i:.6f}"
-        if cmd == "OUTP CH1,ON": state["CH1"]["ON"] = True; return None
-        if cmd == "OUTP CH1,OFF": state["CH1"]["ON"] = False; return None
-        if cmd == "SYST:ERR?": return "0,No error"
+        r = static.get(cmd)
+        if r is not None: return r() if callable(r) else r
+        if cmd.startswith("CH1:VOLT "): ch1["V"] = float(cmd.split()[-1]); return None
+        if cmd.startswith("CH1:CURR "): ch1["I"] = float(cmd.split()[-1]); return None
         return ""
     return h
 
 
 def sdm_handler():
     state = {"idn":"SIGLENT,SDM3045X,MOCK,1.00","func":"VOLT:DC","rng":10.0,"last_v":5.0}
+    # Exact commands resolve by table lookup; callables give state-dependent replies
+    static = {
+        "*IDN?": state["idn"],
+        "READ?": lambda: f"{state['last_v'] + random.uniform(-0.002, 0.002):.6f}",
+        "SYST:ERR?": "0,No error",
+        "*CLS": lambda: None,
+    }
     def h(cmd: str):
-        if cmd == "*IDN?": return state["idn"]
+        r = static.get(cmd)
+        if r is not None: return r() if callable(r) else r
         if cmd.startswith('FUNC "') and cmd.endswith('"'): state["func"] = cmd.split('"')[1]; return None
         if cmd.startswith("CONF:VOLT:DC"):
             parts = cmd.split()
@@ -48,9 +87,6 @@ def sdm_handler():
                 try: state["rng"] = float(parts[1])
                 except Exception: pass
             return None
-        if cmd == "READ?":
-            v = state["last_v"] + random.uniform(-0.002, 0.002); return f"{v:.6f}"
-        if cmd == "SYST:ERR?": return "0,No error"
         return ""
     return h
 
@@ -1,15 +1,23 @@
 #!/usr/bin/env python3
-import sys, re, base64, json, csv
+import sys, os, re, base64, json, csv, zlib, mmap
 if len(sys.argv) < 2:
     print("Usage: extract_from_svg.py path.svg", file=sys.stderr); sys.exit(2)
-text = open(sys.argv[1], "r", encoding="utf-8").read()
-m = re.search(r"<sigbench>([^<]+)</sigbench>", text)
+# Scan the file through an mmap so large SVGs are not copied into a str first
+m = None
+with open(sys.argv[1], "rb") as f:
+    # mmap refuses empty files; those simply have no embedded data
+    if os.fstat(f.fileno()).st_size:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            m = re.search(rb"<sigbench( encoding=\"zlib\")?>([^<]+)</sigbench>", mm)
+            if m:
+                zipped, payload = m.group(1), m.group(2)
 if not m:
     print("No embedded sigbench data found", file=sys.stderr); sys.exit(1)
-b = base64.b64decode(m.group(1))
-obj = json.loads(b.decode("utf-8"))
+b = base64.b64decode(payload)
+if zipped:
+    b = zlib.decompress(b)
+obj = json.loads(b)
 xs, ys = obj.get("x", []), obj.get("y", [])
 w = csv.writer(sys.stdout, lineterminator="\n")
 w.writerow(["t_s","v"])
-for t, v in zip(xs, ys):
-    w.writerow([t, v])
+w.writerows(zip(xs, ys))